@@ -39,8 +39,11 @@
 # domain matching the bucket's name, otherwise the reported links will not be
 # functional.
 #
-# This script is for the python 3.6 runtime on Lambda. Your upload package
-# should include the 'requests' library and its dependencies.
+# This script is for the python 3.8 (or later) runtime on Lambda. Your package
+# should include the 'httpx' library (with its http2 extra) and its
+# dependencies, and may optionally include 'orjson' for faster event parsing.
+# The script itself is architecture-neutral; deploying the function as arm64
+# rather than x86_64 gives the same behavior at lower per-ms cost.
 #
 # You must provide the following environment variables for configuration:
 #
@@ -51,6 +54,12 @@
 #   for the administration of the script's execution. It is used for the 'From'
 #   HTTP header in the Discord webhook request.
 #
+# You may provide the following environment variables for configuration:
+#
+#   DISCORD_KEY_FILTER: A regex which object keys must (search-)match for the
+#   script to report them. Events for non-matching keys are ignored without
+#   making any HTTP request. When unset, every event is reported.
+#
 # You can test this script under Lambda using the following test event. Modify
 # the object key and bucket name as you desire.
 #
@@ -74,39 +83,77 @@
 #
 
 import os
-import requests
-import json
+import re
+import httpx
+
+try:
+    # orjson parses considerably faster than the stdlib and ships arm64
+    # Lambda wheels. Fall back to the stdlib when it isn't bundled.
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 assert 'DISCORD_WEBHOOK' in os.environ
 assert 'ADMIN_EMAIL' in os.environ
 
+if 'DISCORD_KEY_FILTER' in os.environ:
+    key_filter = re.compile(os.environ['DISCORD_KEY_FILTER'])
+else:
+    key_filter = None
+
 req_headers = {
     'From': os.environ['ADMIN_EMAIL']
 }
 
+# A module-level client keeps the HTTPS connection to Discord alive across
+# invocations of a warm Lambda container, avoiding a TCP+TLS handshake per
+# event. HTTP/2 lets any number of posts share that one connection. The
+# timeouts bound how long a single invocation can stall on Discord.
+session = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(5.0, connect=1.0)
+)
+
+# Touch the webhook at import time so the TLS handshake with Discord happens
+# during the Lambda init phase rather than inside the first billed
+# invocation. The response doesn't matter; failures are ignored and any real
+# problem will resurface on the first actual post.
+try:
+    session.head(os.environ['DISCORD_WEBHOOK'], headers=req_headers)
+except Exception:
+    pass
+
 def lambda_handler(event, context):
-    assert len(event['Records']) == 1
-    if 'Sns' in event['Records'][0]:
-        # If this event was delivered via SNS, unwrap it to retrieve the true
-        # S3 event object.
-        event = json.loads(event['Records'][0]['Sns']['Message'])
-        assert len(event['Records']) == 1
-    s3ev = event['Records'][0]['s3']
-    requests.post(
-        os.environ['DISCORD_WEBHOOK'],
-        params={
-            'wait': 'true'
-        },
-        json={
-            'embeds': [
-                {
-                    'title': s3ev['object']['key'].split('/')[-1],
-                    'url': 'https://{}/{}'.format(
-                        s3ev['bucket']['name'],
-                        s3ev['object']['key']
-                    )
-                }
-            ]
-        },
-        headers=req_headers
-    ).raise_for_status()
+    # Events may arrive directly from S3 or wrapped in SNS notifications, and
+    # either source may batch several records into one invocation. Flatten
+    # them all first so the batch can share webhook posts.
+    records = []
+    for record in event['Records']:
+        if 'Sns' in record:
+            records.extend(json_loads(record['Sns']['Message'])['Records'])
+        else:
+            records.append(record)
+    embeds = []
+    for record in records:
+        s3ev = record['s3']
+        key = s3ev['object']['key']
+        bucket = s3ev['bucket']['name']
+        if key_filter is not None and not key_filter.search(key):
+            continue
+        embeds.append({
+            'title': key.rpartition('/')[2] or key,
+            'url': f'https://{bucket}/{key}'
+        })
+    # Discord accepts up to 10 embeds per message, so a batch of N
+    # notifications costs ceil(N/10) posts rather than N.
+    for pos in range(0, len(embeds), 10):
+        session.post(
+            os.environ['DISCORD_WEBHOOK'],
+            params={
+                'wait': 'true'
+            },
+            json={
+                'embeds': embeds[pos:pos + 10]
+            },
+            headers=req_headers
+        ).raise_for_status()
@@ -28,8 +28,15 @@
 #   Bucket:    (string, partition key)
 #   Channel:   (string, sort key)
 #   Pattern:   (string)
+#   Prefix:    (string, optional)
 #   ObjectKey: (string)
 #
+# Prefix, when present, must hold the literal prefix portion of the item's
+# Pattern regex (e.g. 'builds/linux-' for '^builds/linux-.*\.zip$'). It is
+# used to discard non-matching items with a cheap literal comparison before
+# the regex is tried. Items without a Prefix attribute are matched by regex
+# alone.
+#
 # The script should have the following permissions for the table:
 #
 #   Query
@@ -60,78 +67,212 @@
 #
 # The table name is hardcoded in the script, and may be adjusted as necessary.
 #
+# Buckets named in the LATESTFILES_DIRECT_BUCKETS environment variable
+# (comma-separated) are handled without consulting the table's Pattern
+# attributes at all: their object keys are expected to follow the
+# '<channel>/...' convention, and the first path component is used directly
+# as the Channel of the single item to update. Keys without a '/' are ignored
+# for these buckets. This reduces the cost of an event to one conditional
+# UpdateItem with no Query.
+#
+# The deployment package may optionally include 'orjson' for faster event
+# parsing, and 'google-re2' to match Pattern regexes in guaranteed linear
+# time (so a pathological Pattern in the table cannot burn Lambda-seconds on
+# catastrophic backtracking). The script itself is architecture-neutral;
+# deploying the function as arm64 rather than x86_64 gives the same behavior
+# at lower per-ms cost.
+#
 # For bootstrapping purposes, this script may be invoked directly outside of
 # Lambda with a bucket name and object key to immediately populate the tables
 # with initial ObjectKey values. Presence of the given bucket and object on S3
 # are not checked.
 #
 
+import os
 import re
 import sys
 import boto3
 import botocore
-import json
+import botocore.config
+import concurrent.futures
+import time
+
+try:
+    # orjson parses considerably faster than the stdlib and ships arm64
+    # Lambda wheels. Fall back to the stdlib when it isn't bundled (e.g. for
+    # bootstrap runs outside Lambda).
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    # RE2 matches in guaranteed linear time, so an operator mistake in a
+    # stored Pattern cannot trigger catastrophic backtracking against a
+    # crafted object key. Fall back to the stdlib engine when it isn't
+    # bundled.
+    import re2 as re_engine
+except ImportError:
+    re_engine = re
 
 table_name = 'LatestFiles'
 
-db = boto3.client('dynamodb')
+# Buckets whose object keys follow the '<channel>/...' convention, letting
+# the handler address the channel item directly by key instead of matching
+# Pattern regexes discovered through a Query. See the header comment.
+direct_buckets = frozenset(
+    filter(None, os.environ.get('LATESTFILES_DIRECT_BUCKETS', '').split(','))
+)
 
-def lambda_handler(event, context):
-    assert len(event['Records']) == 1
-    if 'Sns' in event['Records'][0]:
-        # If this event was delivered via SNS, unwrap it to retrieve the true
-        # S3 event object.
-        event = json.loads(event['Records'][0]['Sns']['Message'])
-        assert len(event['Records']) == 1
-    s3ev = event['Records'][0]['s3']
-    print('========================================')
-    print(f'Bucket:  {s3ev["bucket"]["name"]}')
-    print(f'Key:     {s3ev["object"]["key"]}')
-    print('========================================')
-    print()
-    resume = {}
-    while True:
-        qr = db.query(
-            TableName=table_name,
-            ProjectionExpression='Channel,Pattern',
-            KeyConditionExpression='#BKT = :bucket',
-            ExpressionAttributeValues={
-                ':bucket': { 'S': s3ev['bucket']['name'] }
-            },
-            ExpressionAttributeNames={
-                '#BKT': 'Bucket'
-            },
-            **resume
-        )
-        for item in qr['Items']:
+# TCP keep-alive lets warm Lambda containers reuse the same TLS connection for
+# every DynamoDB request instead of paying a fresh handshake per call. The
+# client is created at module scope so the connection pool itself also
+# survives across invocations.
+db = boto3.client('dynamodb', config=botocore.config.Config(
+    tcp_keepalive=True,
+    max_pool_connections=10,
+    retries={ 'mode': 'standard', 'max_attempts': 3 }
+))
+
+# Issue a throwaway request at import time so that boto3's lazy service-model
+# load and the first TLS handshake happen during the Lambda init phase rather
+# than inside the first billed invocation. Failures are ignored; any real
+# problem will resurface on the first actual call.
+try:
+    db.describe_endpoints()
+except Exception:
+    pass
+
+# Cache of compiled Pattern regexes, keyed by the pattern string. This lives at
+# module scope so that warm Lambda containers reuse the compiled patterns
+# across invocations instead of recompiling them for every event.
+pattern_cache = {}
+
+def compile_pattern(pattern):
+    result = pattern_cache.get(pattern)
+    if result is None:
+        try:
+            result = re_engine.compile(pattern)
+        except Exception:
+            # Patterns using constructs RE2 doesn't support (such as
+            # backreferences) still work through the stdlib engine.
+            result = re.compile(pattern)
+        pattern_cache[pattern] = result
+    return result
+
+# Channel definitions change rarely compared to how often objects arrive, so
+# the Query results are memoized per bucket for a short TTL. Warm Lambda
+# containers then skip the Query entirely on most invocations.
+channel_cache = {}
+channel_cache_ttl = 60
+
+def get_channels(bucket):
+    entry = channel_cache.get(bucket)
+    if entry is not None and time.monotonic() - entry[0] < channel_cache_ttl:
+        return entry[1]
+    channels = []
+    # The paginator handles LastEvaluatedKey resumption internally. PageSize
+    # is set so a typical bucket's channels fit in a single page while staying
+    # well under DynamoDB's 1 MB response cap.
+    pages = db.get_paginator('query').paginate(
+        TableName=table_name,
+        ProjectionExpression='Channel,Pattern,#PFX',
+        KeyConditionExpression='#BKT = :bucket',
+        ExpressionAttributeValues={
+            ':bucket': { 'S': bucket }
+        },
+        ExpressionAttributeNames={
+            '#BKT': 'Bucket',
+            '#PFX': 'Prefix'
+        },
+        PaginationConfig={ 'PageSize': 100 }
+    )
+    for page in pages:
+        for item in page['Items']:
             assert 'Channel' in item
             assert 'Pattern' in item
             assert 'S' in item['Pattern']
-            if not re.search(item['Pattern']['S'], s3ev['object']['key']):
-                continue
-            try:
-                print(f'    Updating {item["Channel"]["S"]}...')
-                db.update_item(
-                    TableName=table_name,
-                    Key={
-                        'Bucket': { 'S': s3ev['bucket']['name'] },
-                        'Channel': item['Channel']
-                    },
-                    UpdateExpression='SET ObjectKey = :key',
-                    ConditionExpression='attribute_not_exists(ObjectKey) OR (ObjectKey < :key)',
-                    ExpressionAttributeValues={
-                        ':key': { 'S': s3ev['object']['key'] }
-                    }
-                )
-                print('        OK')
-            except botocore.exceptions.ClientError as e:
-                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
-                    raise
-                print('        Already up to date.')
-        if 'LastEvaluatedKey' in qr:
-            resume = { 'ExclusiveStartKey': qr['LastEvaluatedKey'] }
+            channels.append((
+                item['Channel'],
+                item['Prefix']['S'] if 'Prefix' in item else None,
+                compile_pattern(item['Pattern']['S'])
+            ))
+    channel_cache[bucket] = (time.monotonic(), channels)
+    return channels
+
+def update_channel(bucket, channel, key):
+    try:
+        print(f'    Updating {channel["S"]}...')
+        db.update_item(
+            TableName=table_name,
+            Key={
+                'Bucket': { 'S': bucket },
+                'Channel': channel
+            },
+            UpdateExpression='SET ObjectKey = :key',
+            ConditionExpression='attribute_not_exists(ObjectKey) OR (ObjectKey < :key)',
+            ExpressionAttributeValues={
+                ':key': { 'S': key }
+            }
+        )
+        print('        OK')
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print('        Already up to date.')
+
+def lambda_handler(event, context):
+    # Events may arrive directly from S3 or wrapped in SNS notifications, and
+    # either source may batch several records into one invocation. Flatten
+    # them all before doing any database work so the channel cache and the
+    # update pool are shared across the whole batch.
+    records = []
+    for record in event['Records']:
+        if 'Sns' in record:
+            records.extend(json_loads(record['Sns']['Message'])['Records'])
         else:
-            break
+            records.append(record)
+    # For each channel only the greatest matching key in the batch matters,
+    # since the conditional update would reject the lesser ones anyway.
+    best = {}
+    for record in records:
+        s3ev = record['s3']
+        bucket = s3ev['bucket']['name']
+        key = s3ev['object']['key']
+        print('========================================')
+        print(f'Bucket:  {bucket}')
+        print(f'Key:     {key}')
+        print('========================================')
+        print()
+        if bucket in direct_buckets:
+            channel, sep, _ = key.partition('/')
+            if sep:
+                slot = (bucket, channel)
+                if slot not in best or best[slot] < key:
+                    best[slot] = key
+            continue
+        for channel, prefix, pattern in get_channels(bucket):
+            if prefix is not None and not key.startswith(prefix):
+                continue
+            if not pattern.search(key):
+                continue
+            slot = (bucket, channel['S'])
+            if slot not in best or best[slot] < key:
+                best[slot] = key
+    if not best:
+        # Nothing to update. With a fresh channel cache this invocation makes
+        # no DynamoDB calls at all.
+        print('    No matching channels.')
+        return
+    # Each update targets a different key, so the updates are independent and
+    # can be issued concurrently. The pool size matches the client's
+    # max_pool_connections so every worker gets its own connection.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [
+            pool.submit(update_channel, bucket, { 'S': channel }, key)
+            for (bucket, channel), key in best.items()
+        ]
+    for future in futures:
+        future.result()
 
 if __name__ == '__main__':
     if len(sys.argv) != 3: